@@ -1,12 +1,44 @@
 import ast
+import collections
 import esprima
 from esprima import nodes
 
+# statements that end their block: what follows is unreachable, a switch case does not fall through
+TERMINATORS = (ast.Return, ast.Raise, ast.Break, ast.Continue)
 
-def parse_script(code):
-    parser = _Parser()
+
+def parse_script(code, share_functions=False):
+    """
+        Nested defs that are only ever called are moved out of the code that
+        would re-create them. With share_functions, so are defs whose function
+        object escapes (e.g. callbacks), which saves more allocation but makes
+        every evaluation of a function expression return the same object,
+        unlike JS.
+    """
+    parser = _Parser(share_functions)
     js_ast = esprima.parseScript(code, options={"tolerant": True, "loc": True}, delegate=parser)
-    node = ast.Module(body=js_ast.stmts)
+    node = ast.Module(body=js_ast.stmts, type_ignores=[])
+    ast.fix_missing_locations(node)
+    return node
+
+
+def eliminate_dead_code(node, keep=()):
+    """
+        Removes unreachable statements and unused declarations from the
+        output of parse_script, in place.
+
+        Module level names count as unused unless the script reads them or
+        they are in keep, so only use this when nothing reads the globals
+        after the script has run.
+    """
+    _remove_unreachable(node)
+    bound = {}
+    _bound_functions(node, set(), bound)
+    # inner scopes first, so what they drop no longer keeps outer names alive
+    functions = [n for n in ast.walk(node) if isinstance(n, ast.FunctionDef)]
+    for function in reversed(functions):
+        _remove_unused(function, (), bound[function])
+    _remove_unused(node, keep, set())
     ast.fix_missing_locations(node)
     return node
 
@@ -34,8 +66,10 @@ class _Parser:
     update_var = ast.Name(id="update_var", ctx=ast.Load())
     enumerable_properties = ast.Name(id="enumerable_properties", ctx=ast.Load())
 
-    def __init__(self):
+    def __init__(self, share_functions=False):
         self.unique_id = 1
+        self.share_functions = share_functions
+        self.switch_tables = []  # module level dispatch dicts
 
     def __call__(self, node, metadata):
         # esprima.Parser will call this as the delegate
@@ -77,6 +111,16 @@ class _Parser:
             stmts.append(ast.Expr(value=node.expr))
         return stmts
 
+    def _store(self, expr):
+        # a copy of expr to assign to
+        if isinstance(expr, ast.Name):
+            return ast.Name(id=expr.id, ctx=ast.Store())
+        if isinstance(expr, ast.Attribute):
+            return ast.Attribute(value=expr.value, attr=expr.attr, ctx=ast.Store())
+        if isinstance(expr, ast.Subscript):
+            return ast.Subscript(value=expr.value, slice=expr.slice, ctx=ast.Store())
+        return expr
+
     # expressions
 
     def _Literal(self, node):
@@ -203,14 +247,16 @@ class _Parser:
             b = 1
         """
         assert isinstance(node.id, nodes.Identifier)
-        node.expr = node.id
+        node.expr = node.id.expr
 
         """
             {init.stmts}
             {id.name} = {init.expr}
         """
         if node.init:
-            node.stmts = node.init.stmts + [ast.Assign(targets=[node.expr], value=node.init.expr)]
+            node.stmts = node.init.stmts + [
+                ast.Assign(targets=[self._store(node.expr)], value=node.init.expr)
+            ]
             return
 
         """
@@ -226,7 +272,7 @@ class _Parser:
                     ast.ExceptHandler(
                         type=ast.Name(id="NameError", ctx=ast.Load()),
                         name=None,
-                        body=[ast.Assign(targets=[node.expr], value=self.undefined)],
+                        body=[ast.Assign(targets=[self._store(node.expr)], value=self.undefined)],
                     )
                 ],
                 orelse=[],
@@ -246,7 +292,7 @@ class _Parser:
         node.stmts = (
             node.left.stmts
             + node.right.stmts
-            + [ast.Assign(targets=[node.left.expr], value=node.right.expr)]
+            + [ast.Assign(targets=[self._store(node.left.expr)], value=node.right.expr)]
         )
         node.expr = node.left.expr
 
@@ -304,9 +350,10 @@ class _Parser:
 
     def _Program(self, node):
         node.expr = None
+        lifter = _FunctionLifter(self._make_unique_name, self.share_functions)
         node.stmts = [
             ast.ImportFrom(module="ecma.lib", names=[ast.alias(name="*", asname=None)], level=0)
-        ] + sum((self._node_stmts(n) for n in node.body), [])
+        ] + self.switch_tables + lifter.lift(sum((self._node_stmts(n) for n in node.body), []))
 
     def _ExpressionStatement(self, node):
         """
@@ -353,7 +400,10 @@ class _Parser:
             ast.FunctionDef(
                 name=node.id.name,
                 args=ast.arguments(
+                    posonlyargs=[],
                     args=[ast.arg(arg=param.name, annotation=None) for param in node.params],
+                    kwonlyargs=[],
+                    kw_defaults=[],
                     defaults=[],
                     vararg=None,
                     kwarg=None,
@@ -494,7 +544,7 @@ class _Parser:
             + node.right.stmts
             + [
                 ast.For(
-                    target=node.left.declarations[0].id.expr,
+                    target=self._store(node.left.declarations[0].id.expr),
                     iter=ast.Call(
                         func=self.enumerable_properties, args=[node.right.expr], keywords=[]
                     ),
@@ -510,7 +560,7 @@ class _Parser:
             + node.right.stmts
             + [
                 ast.For(
-                    target=node.left.declarations[0].id.expr,
+                    target=self._store(node.left.declarations[0].id.expr),
                     iter=node.right.expr,
                     body=self._node_stmts(node.body) if node.body else [ast.Pass()],
                 )
@@ -551,6 +601,519 @@ class _Parser:
             )
         ]
 
+    def _SwitchCase(self, node):
+        node.expr = None
+        node.stmts = sum((self._node_stmts(n) for n in node.consequent), [])
+
+    # switches with at least this many cases, all constant, dispatch through a dict
+    SWITCH_TABLE_MIN_CASES = 4
+
+    def _SwitchStatement(self, node):
+        """
+            switch ({discriminant}) {
+                case {test}:
+                    {consequent}
+                default:
+                    {consequent}
+            }
+        """
+        node.expr = None
+        discriminant = ast.Name(id=self._make_unique_name("_switch"), ctx=ast.Load())
+        index = ast.Name(id=self._make_unique_name("_case"), ctx=ast.Load())
+        tests = [(i, case.test) for i, case in enumerate(node.cases) if case.test]
+        bodies = [case.stmts for case in node.cases]
+        default = next((i for i, case in enumerate(node.cases) if not case.test), None)
+        if default is None:
+            default = len(bodies)  # no match runs nothing
+            bodies.append([])
+
+        """
+            {discriminant.stmts}
+            {discriminant} = {discriminant.expr}
+            {index} = <index of the first case matching {discriminant}, else default>
+        """
+        node.stmts = node.discriminant.stmts + [
+            ast.Assign(targets=[self._store(discriminant)], value=node.discriminant.expr)
+        ]
+        values = self._switch_values(tests)
+        if values is not None and len(values) >= self.SWITCH_TABLE_MIN_CASES:
+            """
+                {table} = {{test.value}: {case index}}  # at module level
+                {index} = {table}.get({discriminant}, {default})
+            """
+            table = ast.Name(id=self._make_unique_name("_switch_table"), ctx=ast.Load())
+            self.switch_tables.append(
+                ast.Assign(
+                    targets=[self._store(table)],
+                    value=ast.Dict(
+                        keys=[
+                            ast.Str(s=value) if isinstance(value, str) else ast.Num(n=value)
+                            for value in values
+                        ],
+                        values=[ast.Num(n=i) for i in values.values()],
+                    ),
+                )
+            )
+            node.stmts.append(
+                ast.Assign(
+                    targets=[self._store(index)],
+                    value=ast.Call(
+                        func=ast.Attribute(value=table, attr="get", ctx=ast.Load()),
+                        args=[discriminant, ast.Num(n=default)],
+                        keywords=[],
+                    ),
+                )
+            )
+        else:
+            node.stmts += self._switch_chain(discriminant, index, tests, default)
+
+        """
+            for _ in ' ':
+                <cases from {index} on, falling through until a break>
+                break
+            else:
+                continue
+        """
+        runs = [[0]]
+        for i in range(1, len(bodies)):
+            exits = bodies[i - 1] and isinstance(bodies[i - 1][-1], TERMINATORS)
+            falls_through = not exits
+            if falls_through:
+                runs[-1].append(i)
+            else:
+                runs.append([i])
+        body = self._switch_runs(index, bodies, runs)
+        orelse = []
+        if self._switch_continues(body):
+            # a continue in a case continues the loop around the switch
+            body.append(ast.Break())
+            orelse.append(ast.Continue())
+        node.stmts.append(
+            ast.For(
+                target=ast.Name(id=self._make_unique_name(), ctx=ast.Store()),
+                iter=ast.Str(s=" "),
+                body=body or [ast.Pass()],
+                orelse=orelse,
+            )
+        )
+
+    def _switch_values(self, tests):
+        # {test.value: case index} if every test is a number or string literal
+        values = {}
+        for i, test in tests:
+            if (
+                test.type != "Literal"
+                or isinstance(test.value, bool)
+                or not isinstance(test.value, (float, int, str))
+            ):
+                return None
+            values.setdefault(test.value, i)  # the first duplicate wins
+        return values
+
+    def _switch_chain(self, discriminant, index, tests, default):
+        """
+            {test.stmts}
+            if strictly_equal({discriminant}, {test.expr}):
+                {index} = {case index}
+            else:
+                ...
+                    {index} = {default}
+        """
+        stmts = [ast.Assign(targets=[self._store(index)], value=ast.Num(n=default))]
+        for i, test in reversed(tests):
+            stmts = test.stmts + [
+                ast.If(
+                    test=ast.Call(
+                        func=self.strictly_equal, args=[discriminant, test.expr], keywords=[]
+                    ),
+                    body=[ast.Assign(targets=[self._store(index)], value=ast.Num(n=i))],
+                    orelse=stmts,
+                )
+            ]
+        return stmts
+
+    def _switch_runs(self, index, bodies, runs):
+        """
+            if {index} < {first case of middle run}:
+                <earlier runs>
+            else:
+                <later runs>
+        """
+        if len(runs) > 1:
+            middle = len(runs) // 2
+            return [
+                ast.If(
+                    test=ast.Compare(
+                        left=index, ops=[ast.Lt()], comparators=[ast.Num(n=runs[middle][0])]
+                    ),
+                    body=self._switch_runs(index, bodies, runs[:middle]) or [ast.Pass()],
+                    orelse=self._switch_runs(index, bodies, runs[middle:]),
+                )
+            ]
+
+        """
+            if {index} <= {case index}:
+                {case body}
+            ...
+            {last case body}
+        """
+        *entries, last = runs[0]
+        stmts = []
+        for i in entries:
+            if bodies[i]:
+                stmts.append(
+                    ast.If(
+                        test=ast.Compare(left=index, ops=[ast.LtE()], comparators=[ast.Num(n=i)]),
+                        body=bodies[i],
+                        orelse=[],
+                    )
+                )
+        return stmts + bodies[last]
+
+    def _switch_continues(self, stmts):
+        # whether stmts continue the loop they are in
+        for stmt in stmts:
+            if isinstance(stmt, ast.Continue):
+                return True
+            if isinstance(stmt, (ast.While, ast.For)):
+                nested = [stmt.orelse]  # continue in the body is the inner loop's
+            elif isinstance(stmt, ast.FunctionDef):
+                nested = []
+            else:
+                nested = [getattr(stmt, field, None) for field in ("body", "orelse", "finalbody")]
+                nested += [getattr(h, "body", None) for h in getattr(stmt, "handlers", [])]
+            if any(isinstance(n, list) and self._switch_continues(n) for n in nested):
+                return True
+        return False
+
+
+def _scope_nodes(node):
+    # every node in the scope of node, including nested defs but not their contents
+    for child in ast.iter_child_nodes(node):
+        yield child
+        if not isinstance(child, ast.FunctionDef):
+            yield from _scope_nodes(child)
+
+
+def _target_names(target):
+    if isinstance(target, ast.Name):
+        yield target.id
+    elif isinstance(target, (ast.Tuple, ast.List)):
+        for elt in target.elts:
+            yield from _target_names(elt)
+
+
+def _bound_names(func):
+    names = {arg.arg for arg in func.args.args}
+    for node in _scope_nodes(func):
+        if isinstance(node, ast.FunctionDef):
+            names.add(node.name)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+        elif isinstance(node, ast.Assign):
+            for target in node.targets:
+                names.update(_target_names(target))
+        elif isinstance(node, ast.For):
+            names.update(_target_names(node.target))
+    return names
+
+
+def _called_names(nodes):
+    """
+        Names whose value is only ever called, so sharing it can't be seen.
+
+        That is names only used as the function in a call or assigned to,
+        and names only assigned to such names, like "_1" in "g = _1".
+    """
+    uses = collections.Counter()
+    calls = collections.Counter()
+    stores = collections.Counter()
+    aliases = collections.defaultdict(list)  # name -> names it is assigned to
+    for node in nodes:
+        for n in ast.walk(node):
+            if isinstance(n, ast.Name):
+                uses[n.id] += 1
+            elif isinstance(n, ast.Call) and isinstance(n.func, ast.Name):
+                calls[n.func.id] += 1
+            elif isinstance(n, ast.Assign):
+                stores.update(t.id for t in n.targets if isinstance(t, ast.Name))
+                if isinstance(n.value, ast.Name):
+                    aliases[n.value.id] += n.targets
+    called = {name for name, count in uses.items() if count == calls[name] + stores[name]}
+    for name, targets in aliases.items():
+        if uses[name] == len(targets) and all(
+            isinstance(t, ast.Name) and t.id in called for t in targets
+        ):
+            called.add(name)
+    return called
+
+
+def _free_names(func):
+    names = set()
+    for node in _scope_nodes(func):
+        if isinstance(node, ast.Name):
+            names.add(node.id)
+        elif isinstance(node, ast.FunctionDef):
+            names |= _free_names(node)
+    return names - _bound_names(func)
+
+
+class _FunctionLifter(ast.NodeTransformer):
+    """
+        Moves nested defs out of code that would re-create them on every run.
+
+        A def that captures nothing from an enclosing function is lifted to
+        module level. A def that does capture, but sits in a loop, is hoisted
+        to the top of its enclosing function so it is created once per call.
+        Either way the original name is bound by assignment where the def was.
+
+        Only defs whose name is just called are moved, as anything else could
+        tell the shared function object apart, unless share_functions is set.
+    """
+
+    def __init__(self, make_unique_name, share_functions=False):
+        self.make_unique_name = make_unique_name
+        self.share_functions = share_functions
+        self.lifted = []
+        self.scopes = []  # (bound names, hoisted defs, called names) of enclosing functions
+        self.called_names = set()  # of the module
+        self.taken_names = set()
+        self.loop_depth = 0
+
+    def lift(self, stmts):
+        self.called_names = _called_names(stmts)
+        for stmt in stmts:
+            for node in ast.walk(stmt):
+                if isinstance(node, ast.Name):
+                    self.taken_names.add(node.id)
+                elif isinstance(node, ast.FunctionDef):
+                    self.taken_names.add(node.name)
+                    self.taken_names.update(arg.arg for arg in node.args.args)
+        stmts = [self.visit(stmt) for stmt in stmts]
+        return self.lifted + stmts
+
+    def _visit_loop(self, node):
+        self.loop_depth += 1
+        self.generic_visit(node)
+        self.loop_depth -= 1
+        return node
+
+    visit_While = visit_For = _visit_loop
+
+    def visit_FunctionDef(self, node):
+        loop_depth, self.loop_depth = self.loop_depth, 0
+        hoisted = []
+        self.scopes.append((_bound_names(node), hoisted, _called_names([node])))
+        self.generic_visit(node)
+        self.scopes.pop()
+        self.loop_depth = loop_depth
+        node.body = hoisted + node.body
+
+        if not (self.scopes or self.loop_depth):
+            return node  # already created once
+
+        called_names = self.scopes[-1][2] if self.scopes else self.called_names
+        if not (self.share_functions or node.name in called_names):
+            return node  # its identity could be observed
+
+        free_names = _free_names(node)
+        if not any(free_names & bound for bound, _, _ in self.scopes):
+            self.lifted.append(node)
+        elif self.loop_depth:
+            self.scopes[-1][1].append(node)
+        else:
+            return node
+
+        """
+            {name} = {unique name}
+        """
+        name = node.name
+        node.name = self.make_unique_name("_" + name)
+        while node.name in self.taken_names:  # the script's own names are valid JS too
+            node.name = self.make_unique_name("_" + name)
+        return ast.Assign(
+            targets=[ast.Name(id=name, ctx=ast.Store())],
+            value=ast.Name(id=node.name, ctx=ast.Load()),
+        )
+
+
+STMT_LIST_FIELDS = ("body", "orelse", "finalbody")
+PURE_CALLS = {"Number", "String", "Object"}
+
+
+def _stmt_lists(node):
+    for field in STMT_LIST_FIELDS:
+        stmts = getattr(node, field, None)
+        if isinstance(stmts, list):
+            yield field, stmts
+
+
+def _set_stmts(node, field, stmts):
+    if not stmts and field == "body" and not isinstance(node, ast.Module):
+        stmts = [ast.Pass()]
+    setattr(node, field, stmts)
+
+
+def _remove_unreachable(tree):
+    for node in list(ast.walk(tree)):
+        for field, stmts in _stmt_lists(node):
+            for i, stmt in enumerate(stmts):
+                if isinstance(stmt, TERMINATORS):
+                    _set_stmts(node, field, stmts[: i + 1])
+                    break
+
+
+def _is_pure(expr):
+    # literals, which cannot raise or run user code; reading a name can raise
+    if isinstance(expr, (ast.Num, ast.Str, ast.NameConstant)):
+        return True
+    if isinstance(expr, ast.Tuple):
+        return all(_is_pure(elt) for elt in expr.elts)
+    if isinstance(expr, ast.Dict):
+        return all(_is_pure(e) for e in expr.keys + expr.values)
+    if isinstance(expr, ast.Call):
+        return (
+            isinstance(expr.func, ast.Name)
+            and expr.func.id in PURE_CALLS
+            and all(_is_pure(arg) for arg in expr.args)
+            and all(_is_pure(keyword.value) for keyword in expr.keywords)
+        )
+    return False
+
+
+def _declared_names(stmt, functions=()):
+    """
+        Names bound by stmt if running it has no other effect, else None.
+
+        functions are the names of defs that have already run, which can be
+        read without a NameError, e.g. "_1" in "g = _1".
+    """
+    if isinstance(stmt, ast.FunctionDef):
+        return {stmt.name}
+    if isinstance(stmt, ast.Assign):
+        value = stmt.value
+        if all(isinstance(t, ast.Name) for t in stmt.targets) and (
+            _is_pure(value) or isinstance(value, ast.Name) and value.id in functions
+        ):
+            return {t.id for t in stmt.targets}
+        return None
+    """
+        try:
+            {name}
+        except NameError:
+            {name} = undefined
+    """
+    if (
+        isinstance(stmt, ast.Try)
+        and len(stmt.body) == 1
+        and isinstance(stmt.body[0], ast.Expr)
+        and isinstance(stmt.body[0].value, ast.Name)
+        and len(stmt.handlers) == 1
+        and not stmt.orelse
+        and not stmt.finalbody
+    ):
+        name = stmt.body[0].value.id
+        handler = stmt.handlers[0]
+        assign = handler.body[0] if len(handler.body) == 1 else None
+        if (
+            isinstance(handler.type, ast.Name)
+            and handler.type.id == "NameError"
+            and isinstance(assign, ast.Assign)
+            and len(assign.targets) == 1
+            and isinstance(assign.targets[0], ast.Name)
+            and assign.targets[0].id == name
+            and isinstance(assign.value, ast.Name)
+            and assign.value.id == "undefined"
+        ):
+            return {name}
+    return None
+
+
+def _own_nodes(node):
+    # nodes of node itself, leaving out the statements nested in it
+    for field, value in ast.iter_fields(node):
+        if field in STMT_LIST_FIELDS and isinstance(value, list):
+            continue
+        for child in value if isinstance(value, list) else [value]:
+            if isinstance(child, ast.AST):
+                yield child
+                yield from _own_nodes(child)
+
+
+def _function_names(stmt, functions):
+    # names that hold a function once stmt has run, given the functions so far
+    if isinstance(stmt, ast.FunctionDef):
+        return {stmt.name}
+    if isinstance(stmt, ast.Assign) and _declared_names(stmt, functions):
+        if isinstance(stmt.value, ast.Name) and stmt.value.id in functions:
+            return {t.id for t in stmt.targets}
+    return set()
+
+
+def _bound_functions(node, functions, bound):
+    # bound[def] = names of the defs that have run whenever def's body runs
+    stmt_lists = [stmts for _, stmts in _stmt_lists(node)]
+    for handler in getattr(node, "handlers", []):
+        stmt_lists += [stmts for _, stmts in _stmt_lists(handler)]
+    for stmts in stmt_lists:
+        defined = set(functions)
+        for stmt in stmts:
+            defined |= _function_names(stmt, defined)
+            if isinstance(stmt, ast.FunctionDef):
+                bound[stmt] = defined - _bound_names(stmt)  # its locals shadow them
+                _bound_functions(stmt, bound[stmt], bound)
+            else:
+                _bound_functions(stmt, defined, bound)
+
+
+def _remove_unused(scope, keep, functions):
+    """
+        Mark and sweep over the declarations in scope, starting from the
+        names read by every other statement.
+    """
+    used = set(keep)
+    references = collections.defaultdict(set)  # name -> names its declarations read
+    declarations = {}  # id(stmt) -> names it declares
+    containers = []
+    todo = [(scope, functions)]
+    while todo:
+        node, functions = todo.pop()
+        containers.append(node)
+        todo += [(handler, functions) for handler in getattr(node, "handlers", [])]
+        for _, stmts in _stmt_lists(node):
+            defined = set(functions)
+            for stmt in stmts:
+                names = _declared_names(stmt, defined)
+                defined |= _function_names(stmt, defined)
+                if names is None:
+                    used.update(n.id for n in _own_nodes(stmt) if isinstance(n, ast.Name))
+                    todo.append((stmt, defined))
+                    continue
+                declarations[id(stmt)] = names
+                if isinstance(stmt, ast.FunctionDef):
+                    read = _free_names(stmt)
+                else:
+                    read = {n.id for n in ast.walk(stmt) if isinstance(n, ast.Name)}
+                for name in names:
+                    references[name] |= read - names
+
+    todo = list(used)
+    while todo:
+        for name in references.pop(todo.pop(), ()):
+            if name not in used:
+                used.add(name)
+                todo.append(name)
+
+    for node in containers:
+        for field, stmts in _stmt_lists(node):
+            kept = []
+            for stmt in stmts:
+                names = declarations.get(id(stmt))
+                if names is None or names & used:
+                    kept.append(stmt)
+            if len(kept) < len(stmts):
+                _set_stmts(node, field, kept)
+
 
 if __name__ == "__main__":
     import sys
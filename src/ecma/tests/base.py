@@ -14,6 +14,6 @@ def compare(capsys, script):
     output = parse_script(script)
     code = compile(output, "<js>", "exec")
     capsys.readouterr()
-    exec(code, {}, {})
+    exec(code, {})
     captured = capsys.readouterr()
     assert captured.out == expected_output
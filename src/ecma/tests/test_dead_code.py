@@ -0,0 +1,120 @@
+import ast
+
+import pytest
+
+from ..parser import eliminate_dead_code, parse_script
+
+SCRIPT = (
+    "var unused = 1, alsounused; var used = 2; "
+    "function lib(x) { return x + 1; } "
+    "function f(n) { var t = 0; for (var i = 0; i < n; i = i + 1) "
+    "{ if (i < 1) { continue; console.log('c'); } if (i > 2) { break; console.log('b'); } "
+    "t = t + used; } return t; console.log('r'); } "
+    "console.log(f(5))"
+)
+
+
+def defined_names(script, keep=()):
+    module = eliminate_dead_code(parse_script(script), keep)
+    names = set()
+    for node in ast.walk(module):
+        if isinstance(node, ast.FunctionDef):
+            names.add(node.name)
+        elif isinstance(node, ast.Assign):
+            names.update(t.id for t in node.targets if isinstance(t, ast.Name))
+    return names
+
+
+def run(module, capsys):
+    capsys.readouterr()
+    exec(compile(module, "<js>", "exec"), {})
+    return capsys.readouterr().out
+
+
+def logs(script):
+    module = eliminate_dead_code(parse_script(script))
+    return [
+        n
+        for n in ast.walk(module)
+        if isinstance(n, ast.Call) and isinstance(n.func, ast.Attribute) and n.func.attr == "log"
+    ]
+
+
+def test_dead_code_unused_function():
+    assert defined_names("function f() {} function g() {} g()") == {"g"}
+
+
+def test_dead_code_transitive_use():
+    assert defined_names("function f() {} function g() { return f(); } g()") == {"f", "g"}
+
+
+def test_dead_code_recursive_unused():
+    assert defined_names("function f(n) { return f(n); }") == set()
+
+
+def test_dead_code_unused_var():
+    assert defined_names("var a = 1, b; var c = 2; console.log(c)") == {"c"}
+
+
+def test_dead_code_side_effects_kept():
+    assert defined_names("var a = console.log(1)") == {"a"}
+
+
+def test_dead_code_unused_function_expression():
+    assert defined_names("var unused = function () { return 1; }; console.log(2)") == set()
+
+
+def test_dead_code_unused_nested_function_expression():
+    script = "function f() { var g = function () { return 1; }; return 2; } f()"
+    assert defined_names(script) == {"f"}
+
+
+def test_dead_code_unused_nested_function():
+    assert defined_names("function f() { function g() { return 1; } return 2; } f()") == {"f"}
+
+
+def test_dead_code_function_read_before_def_kept():
+    script = "var v = later; function later() { return 1; }"
+    assert defined_names(script) == {"v", "later"}
+
+
+def test_dead_code_name_read_kept():
+    assert defined_names("var a = b; var c = Number(b)") == {"a", "c"}
+
+
+def test_dead_code_keep():
+    assert defined_names("function f() {}", keep=["f"]) == {"f"}
+
+
+def test_dead_code_unreachable():
+    module = eliminate_dead_code(parse_script("function f() { return 1; console.log(2); } f()"))
+    function = next(n for n in module.body if isinstance(n, ast.FunctionDef))
+    assert len(function.body) == 1
+    assert isinstance(function.body[0], ast.Return)
+
+
+def test_dead_code_unreachable_throw():
+    assert not logs("function f() { throw 1; console.log(2); } f()")
+
+
+def test_dead_code_unreachable_break():
+    assert not logs("for (var i = 0; i < 2; i = i + 1) { break; console.log(i); }")
+
+
+def test_dead_code_unreachable_continue():
+    assert not logs("for (var i = 0; i < 2; i = i + 1) { continue; console.log(i); }")
+
+
+def test_dead_code_same_output(capsys):
+    expected = run(parse_script(SCRIPT), capsys)
+    assert expected == "4\n"
+    assert run(eliminate_dead_code(parse_script(SCRIPT)), capsys) == expected
+    assert defined_names(SCRIPT) == {"used", "f", "t", "i"}
+
+
+def test_dead_code_same_error(capsys):
+    script = "var a = b; console.log('ran')"
+    with pytest.raises(NameError):
+        run(parse_script(script), capsys)
+    with pytest.raises(NameError):
+        run(eliminate_dead_code(parse_script(script)), capsys)
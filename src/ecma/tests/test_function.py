@@ -0,0 +1,123 @@
+import ast
+
+from ..parser import parse_script
+from .base import compare
+
+CALLBACK = (
+    "var o = {}; for (var i = 0; i < 2; i = i + 1) { o.each(function (x) { return x; }); }"
+)
+MAKER = "function mk() { return function () { return 1; }; } var a = mk(); var b = mk(); "
+
+
+def find_def(node, prefix):
+    return next(
+        n for n in ast.walk(node) if isinstance(n, ast.FunctionDef) and n.name.startswith(prefix)
+    )
+
+
+def aliases(node):
+    return {
+        (n.targets[0].id, n.value.id)
+        for n in ast.walk(node)
+        if isinstance(n, ast.Assign) and isinstance(n.value, ast.Name)
+    }
+
+
+def test_function_nested_non_capturing(capsys):
+    compare(
+        capsys, "function f(a) { function g(b) { return b + 1; } return g(a); } console.log(f(1))"
+    )
+
+
+def test_function_nested_capturing(capsys):
+    compare(
+        capsys, "function f(a) { function g(b) { return a + b; } return g(2); } console.log(f(1))"
+    )
+
+
+def test_function_expression_in_loop(capsys):
+    compare(
+        capsys,
+        "function f(a) { var t = 0; for (var i = 0; i < 3; i = i + 1) "
+        "{ var g = function (b) { return a + b; }; t = t + g(i); } return t; } console.log(f(1))",
+    )
+
+
+def test_function_nested_recursive(capsys):
+    compare(
+        capsys,
+        "function f(a) { function g(n) { if (n < 2) { return 1; } return n + g(n - 1); } "
+        "return g(a); } console.log(f(4))",
+    )
+
+
+def test_function_identity(capsys):
+    compare(capsys, MAKER + "if (a === b) { console.log('same'); } else { console.log('new'); }")
+
+
+def test_function_identity_properties(capsys):
+    compare(capsys, MAKER + "a.n = 5; b.n = 6; console.log(a.n)")
+
+
+def test_function_lifted():
+    module = parse_script("function f(a) { function g(b) { return b + 1; } return g(a); }")
+    lifted = next(n for n in module.body if isinstance(n, ast.FunctionDef) and n.name != "f")
+    assert lifted.name.startswith("_g_")
+    assert ("g", lifted.name) in aliases(find_def(module, "f"))
+
+
+def test_function_hoisted_from_loop():
+    module = parse_script(
+        "function f(a) { var t = 0; for (var i = 0; i < 3; i = i + 1) "
+        "{ function g(b) { return a + b; } t = t + g(i); } return t; }"
+    )
+    f = find_def(module, "f")
+    hoisted = f.body[0]
+    assert isinstance(hoisted, ast.FunctionDef)
+    assert hoisted.name.startswith("_g_")
+    assert ("g", hoisted.name) in aliases(f)
+
+
+def test_function_escaping_not_lifted():
+    module = parse_script(MAKER)
+    assert [n.name for n in module.body if isinstance(n, ast.FunctionDef)] == ["mk"]
+    assert not aliases(module)
+
+
+def test_function_escaping_shared():
+    module = parse_script(MAKER, share_functions=True)
+    lifted = next(n for n in module.body if isinstance(n, ast.FunctionDef) and n.name != "mk")
+    assert [value for _, value in aliases(find_def(module, "mk"))] == [lifted.name]
+
+
+def test_function_expression_hoisted_from_loop():
+    module = parse_script(
+        "function f(a) { var t = 0; for (var i = 0; i < 3; i = i + 1) "
+        "{ var g = function (b) { return a + b; }; t = t + g(i); } return t; }"
+    )
+    f = find_def(module, "f")
+    hoisted = f.body[0]
+    assert isinstance(hoisted, ast.FunctionDef)
+    anonymous = {name for name, value in aliases(f) if value == hoisted.name}
+    assert {("g", name) for name in anonymous} <= aliases(f)
+
+
+def test_function_callback_in_loop_not_lifted():
+    module = parse_script(CALLBACK)
+    assert not [n for n in module.body if isinstance(n, ast.FunctionDef)]
+
+
+def test_function_callback_in_loop_shared():
+    module = parse_script(CALLBACK, share_functions=True)
+    lifted = [n for n in module.body if isinstance(n, ast.FunctionDef)]
+    assert len(lifted) == 1
+    assert lifted[0].name.startswith("__")
+    assert [value for _, value in aliases(module)] == [lifted[0].name]
+
+
+def test_function_lifted_name_collision(capsys):
+    compare(
+        capsys,
+        "var _g_1 = 5; var g_1 = 6; function f() { function g() { return 1; } return g(); } "
+        "console.log(f(), g_1, _g_1)",
+    )
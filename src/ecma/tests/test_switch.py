@@ -0,0 +1,96 @@
+import ast
+
+from ..parser import parse_script
+from .base import compare
+
+LARGE = (
+    "function step(op, t) { switch (op) { %s default: t = t + 1000; } return t; } "
+    "var t = 0; for (var i = 0; i < 130; i = i + 1) { t = step(i, t); } console.log(t)"
+) % "".join("case %d: t = t + %d; break; " % (i, i) for i in range(120))
+
+DISPATCH = (
+    "function f(c) { var x = 1; switch (c) { "
+    "case 'a': x = x + 1; break; case 'b': x = x + 2; break; "
+    "case 'c': x = x + 3; case 'd': x = x + 4; break; "
+    "case 'e': return 0; default: x = x + 100; } return x; } "
+)
+
+
+def test_switch_table(capsys):
+    compare(capsys, DISPATCH + "console.log(f('a'), f('b'), f('e'), f('z'), f(1))")
+
+
+def test_switch_table_fall_through(capsys):
+    compare(capsys, DISPATCH + "console.log(f('c'), f('d'))")
+
+
+def test_switch_no_match(capsys):
+    compare(capsys, "switch (3) { case 1: console.log('1'); case 2: console.log('2'); }")
+
+
+def test_switch_fall_through(capsys):
+    compare(capsys, "switch (1) { case 1: console.log('1'); case 2: console.log('2'); break; }")
+
+
+def test_switch_default_first(capsys):
+    compare(capsys, "switch (3) { default: console.log('d'); case 1: console.log('1'); }")
+
+
+def test_switch_not_constant(capsys):
+    compare(
+        capsys,
+        "var a = 'x'; switch ('x') { case 'y': console.log('y'); case a: console.log('a'); }",
+    )
+
+
+def test_switch_continue(capsys):
+    compare(
+        capsys,
+        "for (var i = 0; i < 3; i = i + 1) { switch (i) { case 1: continue; } console.log(i); }",
+    )
+
+
+def test_switch_large(capsys):
+    compare(capsys, LARGE)
+
+
+def table_and_lookup(module):
+    tables = [
+        n.targets[0].id
+        for n in module.body
+        if isinstance(n, ast.Assign) and isinstance(n.value, ast.Dict)
+    ]
+    lookups = [
+        n.func.value.id
+        for n in ast.walk(module)
+        if isinstance(n, ast.Call) and isinstance(n.func, ast.Attribute) and n.func.attr == "get"
+    ]
+    return tables, lookups
+
+
+def test_switch_lowered_to_table():
+    tables, lookups = table_and_lookup(parse_script(DISPATCH))
+    assert len(tables) == 1
+    assert tables[0].startswith("_switch_table_")
+    assert lookups == tables
+
+
+def test_switch_large_lowered_to_table():
+    module = parse_script(LARGE)
+    tables, lookups = table_and_lookup(module)
+    assert lookups == tables
+    table = next(n.value for n in module.body if isinstance(n, ast.Assign))
+    assert len(table.keys) == 120
+
+
+def test_switch_not_constant_lowered_to_chain():
+    module = parse_script(
+        "var a = 1; switch (2) { case 1: case 2: case 3: case a: console.log('x'); }"
+    )
+    assert table_and_lookup(module) == ([], [])
+    calls = [
+        n.func.id
+        for n in ast.walk(module)
+        if isinstance(n, ast.Call) and isinstance(n.func, ast.Name)
+    ]
+    assert calls.count("strictly_equal") == 4